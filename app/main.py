@@ -12,22 +12,32 @@ from src.sementic_analysis import (
     extract_semantic_context_libcst,
     extract_calls_and_definitions,
 )
-from app.schemas import UserRequest
+from app.schemas import UserRequest, RepoRegistration
 from src.load_env import env
 import os
+import threading
+import git
 from src.constants import CATEGORIES
+from src.scheduler import (
+    PRIORITIES,
+    QueueFullError,
+    DeadlineExceededError,
+    scheduler_from_env,
+)
+from src.repo_registry import RepositoryNotFoundError, registry_from_env
 
 app = FastAPI()
 
 debug = os.getenv("DEBUG", False)
 repo_path = os.getenv("REPO_PATH")
+scheduler = scheduler_from_env()
+registry = registry_from_env()
+legacy_checkout_lock = threading.Lock()
 
 
 @app.post("/analyze/")
 async def analyze_code(request: UserRequest):
 
-    warnings = []
-
     # Validate request parameters
     if request.categories and not CATEGORIES.get(request.categories):
         raise HTTPException(
@@ -35,25 +45,133 @@ async def analyze_code(request: UserRequest):
             detail=f"Invalid category '{request.categories}'. Valid categories are: {', '.join(CATEGORIES.keys())}.",
         )
 
+    if request.priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid priority '{request.priority}'. Valid priorities are: {', '.join(PRIORITIES.keys())}.",
+        )
+
+    # Queue the analysis behind the scheduler so bursts are shed instead of piling up
+    try:
+        return await scheduler.run(
+            run_analysis,
+            request,
+            priority=request.priority,
+            timeout_ms=request.timeout_ms,
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return scheduler.stats()
+
+
+@app.post("/repos/")
+async def register_repo(registration: RepoRegistration):
+    memory_quota_bytes = (
+        registration.memory_quota_mb * 1024 * 1024 if registration.memory_quota_mb else None
+    )
+    try:
+        repo = registry.register(registration.name, registration.path, memory_quota_bytes)
+    except (git.NoSuchPathError, git.InvalidGitRepositoryError):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Path '{registration.path}' is not a git repository.",
+        )
+    return {"message": f"Repository '{repo.name}' registered.", "stats": repo.stats()}
+
+
+@app.get("/repos/stats")
+async def repo_stats():
+    return registry.stats()
+
+
+def run_analysis(request: UserRequest):
+
+    warnings = []
+
+    # A registered repo gets its own worktree per ref instead of a checkout in place
+    if request.repo:
+        try:
+            repo = registry.get(request.repo)
+        except RepositoryNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+        ref = request.branch_name or request.tag_name or request.commit_hash
+        try:
+            project_root = repo.checkout(ref)
+        except git.GitCommandError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Failed to check out '{ref}' in repository '{repo.name}': {e}",
+            )
+        try:
+            request.file_path = resolve_repo_file(project_root, request.file_path)
+            return build_analysis(request, warnings, project_root, repo)
+        finally:
+            repo.release(ref)
+
     # Check if repo_path is provided in the request or environment variable
     if request.repo_path or repo_path:
-        git_successuful = (
-            fetch_code_from_branch(
-                repo_path=request.repo_path or repo_path,
-                branch_name=request.branch_name or os.getenv("BRANCH_NAME"),
-                tag_name=request.tag_name or os.getenv("TAG_NAME"),
-                commit_hash=request.commit_hash or os.getenv("COMMIT_HASH"),
+        # Legacy requests check out in one shared directory, so they must run one at a time
+        with legacy_checkout_lock:
+            git_successuful = (
+                fetch_code_from_branch(
+                    repo_path=request.repo_path or repo_path,
+                    branch_name=request.branch_name or os.getenv("BRANCH_NAME"),
+                    tag_name=request.tag_name or os.getenv("TAG_NAME"),
+                    commit_hash=request.commit_hash or os.getenv("COMMIT_HASH"),
+                )
+                or os.getenv("COMMIT_HASH"),
             )
-            or os.getenv("COMMIT_HASH"),
+
+            if not git_successuful:
+                warnings.append(
+                    "Failed to fetch code from the specified branch|commit|tag."
+                )
+
+            return build_analysis(request, warnings, os.getenv("PROJECT_ROOT"))
+
+    return build_analysis(request, warnings, os.getenv("PROJECT_ROOT"))
+
+
+def resolve_repo_file(project_root, file_path):
+    """Resolves `file_path` inside `project_root`, rejecting paths that would leave it."""
+    if os.path.isabs(file_path):
+        raise HTTPException(
+            status_code=422,
+            detail="file_path must be relative to the repository root when 'repo' is given.",
+        )
+    root = os.path.realpath(project_root)
+    resolved = os.path.realpath(os.path.join(root, file_path))
+    if not resolved.startswith(root + os.sep):
+        raise HTTPException(
+            status_code=422,
+            detail=f"file_path '{file_path}' is outside the repository.",
         )
+    return resolved
 
-        if not git_successuful:
-            warnings.append(
-                "Failed to fetch code from the specified branch|commit|tag."
-            )
+
+def build_analysis(request: UserRequest, warnings, project_root, repo=None):
 
     # Extract function code
-    function_code, target_function, extract_file = extract_function_code(request.file_path, request.function_name)
+    tree = None
+    if repo:
+        try:
+            tree = repo.parse(request.file_path)
+        except (OSError, SyntaxError):
+            pass  # extract_function_code reports the error itself
+    function_code, target_function, extract_file = extract_function_code(
+        request.file_path, request.function_name, tree=tree
+    )
     # print(function_code)
 
     if not function_code:
@@ -76,7 +194,14 @@ async def analyze_code(request: UserRequest):
     # Semantic Context
     semantic_info = extract_semantic_context_libcst(request.file_path)
 
-    funs_classes = extract_calls_and_definitions(extract_file, target_function, os.getenv("PROJECT_ROOT"))
+    funs_classes = extract_calls_and_definitions(
+        extract_file,
+        target_function,
+        project_root,
+        find_definition=(
+            (lambda name, module: repo.find_definition(name, module, project_root)) if repo else None
+        ),
+    )
     # print(funs_classes)
 
     semantic_info["functions"]  = funs_classes["functions"]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class UserRequest(BaseModel):
@@ -12,3 +12,12 @@ class UserRequest(BaseModel):
     tag_name: str = None
     commit_hash: str = None
     categories: str = None
+    repo: str = None
+    priority: str = "interactive"
+    timeout_ms: int = Field(None, gt=0)
+
+
+class RepoRegistration(BaseModel):
+    name: str
+    path: str
+    memory_quota_mb: int = Field(None, gt=0)
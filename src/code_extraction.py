@@ -1,12 +1,13 @@
 import ast
 
 
-def extract_function_code(file_path, function_name):
+def extract_function_code(file_path, function_name, tree=None):
     try:
         print(file_path)
         try:
-            with open(file_path, "r") as file:
-                tree = ast.parse(file.read())
+            if tree is None:
+                with open(file_path, "r") as file:
+                    tree = ast.parse(file.read())
         except SyntaxError as e:
             print(f"Syntax error in file: {e}")
             return None
@@ -0,0 +1,441 @@
+import ast
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import git
+
+# Parsed ASTs are far larger than their source text; this is a rough multiplier
+# used to estimate how much memory a cached tree holds.
+AST_SIZE_FACTOR = 10
+# Start evicting cold repositories once usage reaches this share of the limit.
+HIGH_WATER_MARK = 0.9
+# How often the main checkout is re-scanned for added, removed or modified files.
+# Worktrees are pinned to a commit and never re-scanned.
+INDEX_RESCAN_SECONDS = 5
+
+
+class RepositoryNotFoundError(Exception):
+    """Raised when a request names a repository that was never registered."""
+
+
+def worktree_dir_name(ref):
+    """Readable but collision-free directory name for `ref` (e.g. `feature/x` vs `feature_x`)."""
+    readable = re.sub(r"[^A-Za-z0-9._-]", "_", ref)[:40]
+    return f"{readable}-{hashlib.sha1(ref.encode()).hexdigest()[:12]}"
+
+
+def find_top_level_definition(tree, name):
+    for node in tree.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef)) and node.name == name:
+            return ast.unparse(node)
+    return None
+
+
+def imports_name(tree, name):
+    """Whether the module imports `name` at top level, i.e. may re-export it."""
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == "*" or (alias.asname or alias.name) == name:
+                    return True
+    return False
+
+
+class Repository:
+    """
+    A registered repository with its own parse cache, symbol index and worktrees.
+
+    Args:
+        name (str): Name the repository is registered under.
+        path (str): Path to the git repository on disk.
+        memory_quota_bytes (int, optional): Upper bound for this repository's caches.
+        worktree_root (str, optional): Directory that holds the per-ref worktrees. Defaults to a
+            directory named after the registration, so two registrations never share worktrees.
+        max_worktrees (int, optional): Idle worktrees beyond this count are removed, least recently used first.
+        on_grow (callable, optional): Called with the repository whenever its caches grow.
+    """
+
+    def __init__(self, name, path, memory_quota_bytes=None, worktree_root=None, max_worktrees=8, on_grow=None):
+        self.name = name
+        self.path = str(Path(path).resolve())
+        self.memory_quota_bytes = memory_quota_bytes
+        self.worktree_root = worktree_root or os.path.join(
+            self.path, ".git", "analyzer-worktrees", worktree_dir_name(name)
+        )
+        self.max_worktrees = max_worktrees
+        self.on_grow = on_grow
+        self.last_access = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._parse_cache = OrderedDict()  # file path -> (mtime, size, tree)
+        self._parse_cache_bytes = 0
+        self._symbol_index = {}  # root -> (signature, size, {symbol name: [file paths]}, checked_at)
+        self._symbol_index_bytes = 0
+        self._worktrees = OrderedDict()  # ref -> {"path", "sha", "users"}
+        self._ref_locks = {}  # ref -> lock serialising git commands for that worktree
+        self._lock = threading.RLock()  # guards the caches and bookkeeping, never held during git I/O
+
+    def touch(self):
+        self.last_access = time.time()
+
+    def memory_bytes(self):
+        return self._parse_cache_bytes + self._symbol_index_bytes
+
+    def checkout(self, ref=None):
+        """
+        Returns the directory holding `ref`, creating a dedicated worktree for it if needed.
+
+        Without a ref the main checkout is returned untouched, so concurrent requests for
+        different refs never run `git checkout` in the same directory. An existing worktree
+        is only checked out again when `ref` now resolves to a different commit, i.e. a
+        branch that moved. Every call with a ref must be paired with `release(ref)`.
+        """
+        self.touch()
+        if not ref:
+            return self.path
+
+        with self._lock:
+            ref_lock = self._ref_locks.setdefault(ref, threading.Lock())
+
+        with ref_lock:
+            sha = git.Repo(self.path).git.rev_parse("--verify", f"{ref}^{{commit}}")
+            with self._lock:
+                worktree = self._worktrees.get(ref)
+
+            if worktree is None or not os.path.isdir(worktree["path"]):
+                path = os.path.join(self.worktree_root, worktree_dir_name(ref))
+                if os.path.isdir(path):
+                    git.Repo(path).git.checkout("--detach", sha)
+                else:
+                    os.makedirs(self.worktree_root, exist_ok=True)
+                    git.Repo(self.path).git.worktree("add", "--detach", path, sha)
+                worktree = {"path": path, "sha": sha, "users": 0}
+                self._drop_symbol_index(path)
+            elif worktree["sha"] != sha:
+                git.Repo(worktree["path"]).git.checkout("--detach", sha)
+                worktree["sha"] = sha
+                self._drop_symbol_index(worktree["path"])
+
+            with self._lock:
+                worktree["users"] += 1
+                self._worktrees[ref] = worktree
+                self._worktrees.move_to_end(ref)
+
+        self._prune_worktrees()
+        return worktree["path"]
+
+    def release(self, ref=None):
+        """Marks one use of the worktree for `ref` as finished so it may be pruned."""
+        if not ref:
+            return
+        with self._lock:
+            worktree = self._worktrees.get(ref)
+            if worktree:
+                worktree["users"] -= 1
+        self._prune_worktrees()
+
+    def _prune_worktrees(self):
+        with self._lock:
+            excess = len(self._worktrees) - self.max_worktrees
+            idle = [ref for ref, worktree in self._worktrees.items() if worktree["users"] == 0]
+        for ref in idle[:max(excess, 0)]:
+            with self._ref_locks[ref]:
+                with self._lock:
+                    worktree = self._worktrees.get(ref)
+                    if worktree is None or worktree["users"] or len(self._worktrees) <= self.max_worktrees:
+                        continue
+                    del self._worktrees[ref]
+                git.Repo(self.path).git.worktree("remove", "--force", worktree["path"])
+                self._drop_symbol_index(worktree["path"])
+                self._drop_parse_cache(worktree["path"])
+
+    def parse(self, file_path):
+        """Returns the parsed AST of `file_path`, reusing the cached tree while the file is unchanged."""
+        file_path = str(Path(file_path).resolve())
+        self.touch()
+        mtime = os.stat(file_path).st_mtime
+
+        with self._lock:
+            cached = self._parse_cache.get(file_path)
+            if cached and cached[0] == mtime:
+                self._parse_cache.move_to_end(file_path)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+
+        with open(file_path, "r") as file:
+            source = file.read()
+        tree = ast.parse(source, filename=file_path)
+        size = sys.getsizeof(source) * AST_SIZE_FACTOR
+
+        with self._lock:
+            old = self._parse_cache.pop(file_path, None)
+            if old:
+                self._parse_cache_bytes -= old[1]
+            self._parse_cache[file_path] = (mtime, size, tree)
+            self._parse_cache_bytes += size
+            self._enforce_quota()
+        self._grew()
+        return tree
+
+    def find_definition(self, name, module, root=None):
+        """
+        Finds the source of a top-level class or function `name` imported from `module`.
+
+        The module is resolved against `root` (a worktree or the main checkout). If the
+        module does not define the name but imports it, i.e. re-exports it, the symbol
+        index is consulted for definitions inside that module's own package only.
+
+        Returns:
+            str: The source code of the definition if found, otherwise None.
+        """
+        root = os.path.realpath(root or self.path)
+        module_path = os.path.join(root, *module.split("."))
+        for path in (module_path + ".py", os.path.join(module_path, "__init__.py")):
+            try:
+                tree = self.parse(path)
+            except (FileNotFoundError, SyntaxError):
+                continue
+
+            definition = find_top_level_definition(tree, name)
+            if definition or not imports_name(tree, name):
+                return definition
+
+            package_dir = os.path.dirname(path) + os.sep
+            for candidate in self.symbol_index(root).get(name, []):
+                if candidate == path or not candidate.startswith(package_dir):
+                    continue
+                try:
+                    definition = find_top_level_definition(self.parse(candidate), name)
+                except (FileNotFoundError, SyntaxError):
+                    continue
+                if definition:
+                    return definition
+            return None
+        return None
+
+    def symbol_index(self, root=None):
+        """
+        Returns a mapping of top-level class and function names to the files defining them.
+
+        For the main checkout the index is rebuilt when a Python file is added, removed or
+        modified, checked at most every INDEX_RESCAN_SECONDS. Worktrees are pinned to a commit,
+        so their index is reused until `checkout()` moves them.
+        """
+        root = os.path.realpath(root or self.path)
+        self.touch()
+        with self._lock:
+            cached = self._symbol_index.get(root)
+            pinned = root in {os.path.realpath(w["path"]) for w in self._worktrees.values()}
+            if cached and (pinned or time.monotonic() - cached[3] < INDEX_RESCAN_SECONDS):
+                self.hits += 1
+                return cached[2]
+
+        files, signature = self._scan(root)
+        with self._lock:
+            cached = self._symbol_index.get(root)
+            if cached and cached[0] == signature:
+                self._symbol_index[root] = cached[:3] + (time.monotonic(),)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+
+        index = {}
+        size = 0
+        for path in files:
+            try:
+                tree = self.parse(path)
+            except (SyntaxError, UnicodeDecodeError, OSError):
+                continue
+            for node in tree.body:
+                if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+                    index.setdefault(node.name, []).append(path)
+                    size += sys.getsizeof(node.name) + sys.getsizeof(path)
+
+        with self._lock:
+            cached = self._symbol_index.get(root)
+            if cached and cached[0] == signature:
+                # Another thread built the same index meanwhile; keep theirs.
+                return cached[2]
+            if cached:
+                self._symbol_index_bytes -= cached[1]
+            self._symbol_index[root] = (signature, size, index, time.monotonic())
+            self._symbol_index_bytes += size
+            self._enforce_quota()
+        self._grew()
+        return index
+
+    @staticmethod
+    def _scan(root):
+        # Cheap change detection: listing and stat-ing files costs far less than parsing them.
+        files = []
+        latest_mtime = 0
+        for dir_path, dir_names, file_names in os.walk(root):
+            dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+            latest_mtime = max(latest_mtime, os.stat(dir_path).st_mtime)
+            for file in file_names:
+                if file.endswith(".py"):
+                    path = os.path.join(dir_path, file)
+                    files.append(path)
+                    latest_mtime = max(latest_mtime, os.stat(path).st_mtime)
+        return files, (len(files), latest_mtime)
+
+    def _drop_symbol_index(self, root):
+        with self._lock:
+            cached = self._symbol_index.pop(os.path.realpath(root), None)
+            if cached:
+                self._symbol_index_bytes -= cached[1]
+
+    def _drop_parse_cache(self, root):
+        prefix = os.path.realpath(root) + os.sep
+        with self._lock:
+            for path in [path for path in self._parse_cache if path.startswith(prefix)]:
+                self._parse_cache_bytes -= self._parse_cache.pop(path)[1]
+
+    def evict(self):
+        """Drops every cache held for this repository; registration and worktrees are kept."""
+        with self._lock:
+            self._parse_cache.clear()
+            self._parse_cache_bytes = 0
+            self._symbol_index.clear()
+            self._symbol_index_bytes = 0
+            self.evictions += 1
+
+    def shrink_to(self, max_bytes):
+        """Drops least recently used trees, then the symbol indexes, until caches fit in `max_bytes`."""
+        with self._lock:
+            while self._parse_cache and self.memory_bytes() > max_bytes:
+                _, (_, size, _) = self._parse_cache.popitem(last=False)
+                self._parse_cache_bytes -= size
+            if self.memory_bytes() > max_bytes:
+                self._symbol_index.clear()
+                self._symbol_index_bytes = 0
+
+    def _enforce_quota(self):
+        if self.memory_quota_bytes:
+            self.shrink_to(self.memory_quota_bytes)
+
+    def _grew(self):
+        # Called without holding self._lock, so the callback may lock other repositories.
+        if self.on_grow:
+            self.on_grow(self)
+
+    def stats(self):
+        # Worker threads mutate these dicts; read them under the lock.
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "memory_bytes": self.memory_bytes(),
+                "memory_quota_bytes": self.memory_quota_bytes,
+                "parse_cache_entries": len(self._parse_cache),
+                "index_symbols": sum(len(cached[2]) for cached in self._symbol_index.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "last_access": self.last_access,
+                "worktrees": {ref: worktree["path"] for ref, worktree in self._worktrees.items()},
+            }
+
+
+class RepositoryRegistry:
+    """
+    Holds every repository served by this process.
+
+    Args:
+        memory_limit_bytes (int, optional): Budget shared by all repositories' caches.
+            Once usage nears it, the least recently accessed repositories are evicted.
+        default_quota_bytes (int, optional): Quota for repositories registered without one.
+        max_worktrees (int, optional): Worktrees kept per repository.
+    """
+
+    def __init__(self, memory_limit_bytes=None, default_quota_bytes=None, max_worktrees=8):
+        self.memory_limit_bytes = memory_limit_bytes
+        self.default_quota_bytes = default_quota_bytes
+        self.max_worktrees = max_worktrees
+        self._repos = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, path, memory_quota_bytes=None):
+        """Registers (or re-registers) a repository and returns it."""
+        git.Repo(path)  # Raises if `path` is not a git repository
+        with self._lock:
+            existing = self._repos.get(name)
+            if existing and existing.path == str(Path(path).resolve()):
+                existing.memory_quota_bytes = memory_quota_bytes or self.default_quota_bytes
+                return existing
+            repo = Repository(
+                name,
+                path,
+                memory_quota_bytes or self.default_quota_bytes,
+                max_worktrees=self.max_worktrees,
+                on_grow=self.enforce_limit,
+            )
+            self._repos[name] = repo
+            return repo
+
+    def get(self, name):
+        """Returns the repository registered under `name`, making room for it if memory is tight."""
+        repo = self.repositories().get(name)
+        if repo is None:
+            raise RepositoryNotFoundError(f"Repository '{name}' is not registered.")
+        repo.touch()
+        self.enforce_limit(repo)
+        return repo
+
+    def repositories(self):
+        with self._lock:
+            return dict(self._repos)
+
+    def memory_bytes(self):
+        return sum(repo.memory_bytes() for repo in self.repositories().values())
+
+    def enforce_limit(self, active=None):
+        """
+        Evicts the coldest repositories until usage is below the high-water mark.
+
+        `active` (the repository that is growing or being served) goes last: it is only
+        trimmed, least recently used trees first, once every other repository is empty.
+        """
+        if not self.memory_limit_bytes:
+            return
+        target = self.memory_limit_bytes * HIGH_WATER_MARK
+        if self.memory_bytes() <= target:
+            return
+        with self._lock:
+            cold_first = sorted(
+                (repo for repo in self.repositories().values() if repo is not active and repo.memory_bytes()),
+                key=lambda repo: repo.last_access or 0,
+            )
+            for repo in cold_first:
+                if self.memory_bytes() <= target:
+                    break
+                repo.evict()
+            if active is not None and self.memory_bytes() > target:
+                others = self.memory_bytes() - active.memory_bytes()
+                active.shrink_to(max(target - others, 0))
+
+    def stats(self):
+        return {
+            "memory_bytes": self.memory_bytes(),
+            "memory_limit_bytes": self.memory_limit_bytes,
+            "repositories": {name: repo.stats() for name, repo in self.repositories().items()},
+        }
+
+
+def registry_from_env():
+    """Builds a RepositoryRegistry configured from REGISTRY_* environment variables."""
+    memory_limit_mb = os.getenv("REGISTRY_MEMORY_LIMIT_MB")
+    default_quota_mb = os.getenv("REGISTRY_DEFAULT_QUOTA_MB")
+    return RepositoryRegistry(
+        memory_limit_bytes=int(memory_limit_mb) * 1024 * 1024 if memory_limit_mb else None,
+        default_quota_bytes=int(default_quota_mb) * 1024 * 1024 if default_quota_mb else None,
+        max_worktrees=int(os.getenv("REGISTRY_MAX_WORKTREES") or 8),
+    )
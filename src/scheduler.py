@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Lower value is served first.
+PRIORITIES = {
+    "interactive": 0,
+    "batch": 1,
+}
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler queue is full and the request is shed."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Scheduler queue is full. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request's deadline passes before it gets to run."""
+
+
+class RequestScheduler:
+    """
+    Admission control in front of the analysis pipeline.
+
+    At most `max_concurrency` jobs run at once on a dedicated thread pool.
+    Further requests wait in a bounded priority queue (interactive before
+    batch, FIFO within a class). Requests arriving to a full queue are shed
+    immediately, and requests whose deadline expires while queued are
+    cancelled instead of being run.
+
+    Args:
+        max_concurrency (int): Number of jobs allowed to run at the same time.
+        max_queue_size (int): Number of jobs allowed to wait for a free slot.
+        default_timeout_ms (int, optional): Deadline applied when a request has none.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue_size=32, default_timeout_ms=None):
+        if default_timeout_ms is not None and default_timeout_ms <= 0:
+            raise ValueError(f"default_timeout_ms must be positive, got {default_timeout_ms}.")
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.default_timeout_ms = default_timeout_ms
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="analyze"
+        )
+        self._running = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._stats = {
+            "admitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "shed_queue_full": 0,
+            "shed_deadline": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+            "run_ms_total": 0.0,
+            "run_ms_max": 0.0,
+        }
+
+    async def run(self, func, *args, priority="interactive", timeout_ms=None, **kwargs):
+        """
+        Runs `func(*args, **kwargs)` on the scheduler's thread pool once a slot is free.
+
+        Raises:
+            QueueFullError: If the queue is full when the request arrives.
+            DeadlineExceededError: If the deadline passes before the job starts.
+        """
+        enqueued_at = time.monotonic()
+        if timeout_ms is None:
+            timeout_ms = self.default_timeout_ms
+        if timeout_ms is not None and timeout_ms <= 0:
+            raise ValueError(f"timeout_ms must be positive, got {timeout_ms}.")
+        deadline = enqueued_at + timeout_ms / 1000 if timeout_ms is not None else None
+
+        try:
+            await self._acquire(PRIORITIES[priority], deadline)
+        except DeadlineExceededError:
+            self._record("queue_wait_ms", (time.monotonic() - enqueued_at) * 1000)
+            raise
+
+        started_at = time.monotonic()
+        self._record("queue_wait_ms", (started_at - enqueued_at) * 1000)
+        if deadline is not None and started_at >= deadline:
+            self._stats["shed_deadline"] += 1
+            self._release()
+            raise DeadlineExceededError(
+                f"Request deadline of {timeout_ms} ms passed before it could run."
+            )
+
+        self._stats["admitted"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            job = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # The slot belongs to the job, not to this coroutine: if the caller is
+        # cancelled the thread keeps running, so only give the slot back once it ends.
+        job.add_done_callback(
+            lambda job: loop.call_soon_threadsafe(self._finish, job, started_at)
+        )
+        return await asyncio.wrap_future(job)
+
+    def _finish(self, job, started_at):
+        self._record("run_ms", (time.monotonic() - started_at) * 1000)
+        error = None if job.cancelled() else job.exception()
+        if job.cancelled():
+            self._stats["failed"] += 1
+        elif error is None:
+            self._stats["completed"] += 1
+        elif getattr(error, "status_code", 500) < 500:
+            # Client errors such as HTTPException(404) are the caller's fault, not the pipeline's.
+            self._stats["rejected"] += 1
+        else:
+            self._stats["failed"] += 1
+        self._release()
+
+    async def _acquire(self, priority, deadline):
+        if self._running < self.max_concurrency and not self._waiters:
+            self._running += 1
+            return
+
+        if len(self._waiters) >= self.max_queue_size:
+            self._stats["shed_queue_full"] += 1
+            raise QueueFullError(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats["shed_deadline"] += 1
+                raise DeadlineExceededError(
+                    "Request deadline passed while waiting in the queue."
+                ) from None
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the next live waiter, if any.
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _record(self, name, value_ms):
+        self._stats[f"{name}_total"] += value_ms
+        self._stats[f"{name}_max"] = max(self._stats[f"{name}_max"], value_ms)
+
+    def retry_after(self):
+        """Estimates in whole seconds how long until a queued request would be served."""
+        finished = self._stats["completed"] + self._stats["failed"] + self._stats["rejected"]
+        avg_run_s = self._stats["run_ms_total"] / finished / 1000 if finished else 1
+        backlog = len(self._waiters) + self._running
+        return max(1, math.ceil(avg_run_s * backlog / self.max_concurrency))
+
+    def stats(self):
+        """Returns counters plus current queue depth, running jobs and averages."""
+        stats = dict(self._stats)
+        finished = stats["completed"] + stats["failed"] + stats["rejected"]
+        waited = stats["admitted"] + stats["shed_deadline"]
+        stats["queue_depth"] = len(self._waiters)
+        stats["running"] = self._running
+        stats["queue_wait_ms_avg"] = stats["queue_wait_ms_total"] / waited if waited else 0.0
+        stats["run_ms_avg"] = stats["run_ms_total"] / finished if finished else 0.0
+        return stats
+
+
+def scheduler_from_env():
+    """Builds a RequestScheduler configured from SCHEDULER_* environment variables."""
+    default_timeout_ms = os.getenv("SCHEDULER_DEFAULT_TIMEOUT_MS")
+    return RequestScheduler(
+        max_concurrency=int(os.getenv("SCHEDULER_MAX_CONCURRENCY") or 4),
+        max_queue_size=int(os.getenv("SCHEDULER_MAX_QUEUE_SIZE") or 32),
+        default_timeout_ms=int(default_timeout_ms) if default_timeout_ms else None,
+    )
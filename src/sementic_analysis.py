@@ -97,7 +97,7 @@ def resolve_import(import_name, project_root):
                 return os.path.join(root, file)
     return None
 
-def extract_calls_and_definitions(parsed_ast, target_function, project_root):
+def extract_calls_and_definitions(parsed_ast, target_function, project_root, find_definition=None):
     """
     Extracts all function calls, class instantiations, and their definitions from a parsed AST.
 
@@ -105,6 +105,8 @@ def extract_calls_and_definitions(parsed_ast, target_function, project_root):
         parsed_ast (ast.Module): The parsed AST of the target file.
         target_function_name (str): Name of the function to analyze.
         project_root (str): Path to the root directory of the project.
+        find_definition (callable, optional): Looks up `(name, module)` for imported names,
+            e.g. a registered repository's cached lookup. Defaults to reading the module file.
 
     Returns:
         dict: A dictionary containing:
@@ -117,6 +119,9 @@ def extract_calls_and_definitions(parsed_ast, target_function, project_root):
     class_calls = []
     definitions = {}
 
+    if find_definition is None:
+        find_definition = lambda name, module: find_definition_in_file(name, module.replace('.', '/')+".py")
+
     # Step 1: Locate the target function in the parsed AST
     target_function = target_function
 
@@ -139,7 +144,7 @@ def extract_calls_and_definitions(parsed_ast, target_function, project_root):
                         # Check imports
                         for imp in parsed_ast.body:
                             if isinstance(imp, ast.ImportFrom):
-                                definition = find_definition_in_file(class_name, imp.module.replace('.', '/')+".py")
+                                definition = find_definition(class_name, imp.module)
 
                     if definition:
                         definitions[class_name] = definition
@@ -162,7 +167,7 @@ def extract_calls_and_definitions(parsed_ast, target_function, project_root):
                     # Check imports
                     for imp in parsed_ast.body:
                         if isinstance(imp, ast.ImportFrom):
-                            definition = find_definition_in_file(func_name, imp.module.replace('.', '/')+".py")
+                            definition = find_definition(func_name, imp.module)
 
 
                 if definition:
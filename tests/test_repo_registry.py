@@ -0,0 +1,162 @@
+import os
+import subprocess
+
+import pytest
+
+pytest.importorskip("git")
+
+from src import repo_registry
+from src.repo_registry import Repository, RepositoryRegistry
+
+
+def git(repo_path, *args):
+    subprocess.run(
+        ["git", "-C", str(repo_path), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        check=True,
+        capture_output=True,
+    )
+
+
+def write(repo_path, relative_path, content):
+    path = repo_path / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+@pytest.fixture
+def repo_path(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    git(path, "init", "-q")
+    write(path, "pkg/__init__.py", "from pkg.util import helper\n")
+    write(path, "pkg/util.py", "def helper():\n    return 1\n")
+    write(path, "pkg/a.py", "def local():\n    return 2\n")
+    write(path, "pkg/other.py", "def run():\n    return 3\n")
+    git(path, "add", ".")
+    git(path, "commit", "-qm", "initial")
+    return path
+
+
+def test_find_definition_stays_within_the_imported_module(repo_path):
+    repo = Repository("repo", repo_path)
+    assert "return 2" in repo.find_definition("local", "pkg.a")
+    # Follows the re-export in pkg/__init__.py.
+    assert "return 1" in repo.find_definition("helper", "pkg")
+    # `run` is defined elsewhere in the repo but is not imported from pkg.a.
+    assert repo.find_definition("run", "pkg.a") is None
+
+
+def test_symbol_index_is_built_lazily_and_refreshed(repo_path, monkeypatch):
+    monkeypatch.setattr(repo_registry, "INDEX_RESCAN_SECONDS", 0)
+    repo = Repository("repo", repo_path)
+    repo.find_definition("local", "pkg.a")
+    assert repo.stats()["index_symbols"] == 0
+
+    assert "helper" in repo.symbol_index()
+    write(repo_path, "pkg/late.py", "def late():\n    return 4\n")
+    assert "late" in repo.symbol_index()
+
+
+def test_worktree_index_is_not_rescanned(repo_path, monkeypatch):
+    monkeypatch.setattr(repo_registry, "INDEX_RESCAN_SECONDS", 0)
+    git(repo_path, "tag", "v1")
+    repo = Repository("repo", repo_path)
+    worktree = repo.checkout("v1")
+    repo.symbol_index(worktree)
+
+    monkeypatch.setattr(Repository, "_scan", lambda root: pytest.fail("worktree was re-scanned"))
+    assert "helper" in repo.symbol_index(worktree)
+
+
+def test_symbol_index_is_counted_once(repo_path):
+    repo = Repository("repo", repo_path)
+    repo.symbol_index()
+    index_bytes = repo._symbol_index_bytes
+    repo._symbol_index.clear()  # force a rebuild, as a concurrent miss would
+    repo._symbol_index_bytes = 0
+    repo.symbol_index()
+    repo.symbol_index()
+    assert repo._symbol_index_bytes == index_bytes
+
+
+def test_refs_get_distinct_worktrees(repo_path):
+    git(repo_path, "branch", "feature/x")
+    git(repo_path, "branch", "feature_x")
+    repo = Repository("repo", repo_path)
+    slashed = repo.checkout("feature/x")
+    underscored = repo.checkout("feature_x")
+    assert slashed != underscored
+    assert os.path.isfile(os.path.join(slashed, "pkg", "util.py"))
+
+
+def test_registrations_of_one_path_own_their_worktrees(repo_path):
+    git(repo_path, "tag", "v2")
+    git(repo_path, "tag", "v3")
+    registry = RepositoryRegistry(max_worktrees=1)
+    a = registry.register("a", repo_path)
+    b = registry.register("b", repo_path)
+
+    in_use = a.checkout("v2")
+    assert b.checkout("v2") != in_use
+    b.release("v2")
+    b.checkout("v3")
+
+    assert os.path.isdir(in_use)
+    assert b.stats()["worktrees"].keys() == {"v3"}
+
+
+def test_moved_branch_is_checked_out_again(repo_path):
+    git(repo_path, "branch", "dev")
+    repo = Repository("repo", repo_path)
+    worktree = repo.checkout("dev")
+    repo.release("dev")
+
+    git(repo_path, "checkout", "-q", "dev")
+    write(repo_path, "pkg/new.py", "def new():\n    return 5\n")
+    git(repo_path, "add", ".")
+    git(repo_path, "commit", "-qm", "new")
+
+    assert repo.checkout("dev") == worktree
+    assert os.path.isfile(os.path.join(worktree, "pkg", "new.py"))
+
+
+def test_idle_worktrees_are_pruned(repo_path):
+    for tag in ("v1", "v2", "v3"):
+        git(repo_path, "tag", tag)
+    repo = Repository("repo", repo_path, max_worktrees=2)
+    in_use = repo.checkout("v1")
+    for tag in ("v2", "v3"):
+        repo.checkout(tag)
+        repo.release(tag)
+
+    assert set(repo.stats()["worktrees"]) == {"v1", "v3"}
+    assert os.path.isdir(in_use)
+
+
+def test_pruned_worktree_leaves_no_cached_trees(repo_path):
+    git(repo_path, "tag", "v1")
+    git(repo_path, "tag", "v2")
+    repo = Repository("repo", repo_path, max_worktrees=1)
+    worktree = repo.checkout("v1")
+    repo.parse(os.path.join(worktree, "pkg", "util.py"))
+    repo.release("v1")
+    assert repo.memory_bytes() > 0
+
+    repo.checkout("v2")
+    assert repo.stats()["parse_cache_entries"] == 0
+    assert repo.memory_bytes() == 0
+
+
+def test_cold_repositories_are_evicted_as_caches_grow(repo_path):
+    registry = RepositoryRegistry(memory_limit_bytes=3000)
+    cold = registry.register("cold", repo_path)
+    hot = registry.register("hot", repo_path)
+    cold.parse(repo_path / "pkg" / "util.py")
+    cold.parse(repo_path / "pkg" / "a.py")
+
+    hot.parse(repo_path / "pkg" / "other.py")
+    hot.parse(repo_path / "pkg" / "__init__.py")
+
+    assert cold.memory_bytes() == 0
+    assert hot.memory_bytes() > 0
+    assert registry.memory_bytes() <= 3000
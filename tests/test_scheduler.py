@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.scheduler import DeadlineExceededError, QueueFullError, RequestScheduler
+
+
+def blocking_job(release, started=None, result=None):
+    if started is not None:
+        started.set()
+    release.wait(5)
+    return result
+
+
+async def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.005)
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_queue_size=1)
+        release = threading.Event()
+        running = asyncio.create_task(scheduler.run(blocking_job, release))
+        queued = asyncio.create_task(scheduler.run(blocking_job, release))
+        await wait_until(lambda: scheduler.stats()["queue_depth"] == 1)
+
+        with pytest.raises(QueueFullError) as excinfo:
+            await scheduler.run(blocking_job, release)
+        assert excinfo.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(running, queued)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed_queue_full"] == 1
+    assert stats["completed"] == 2
+    assert stats["running"] == 0
+
+
+def test_request_past_deadline_is_cancelled_not_run():
+    calls = []
+
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_queue_size=4)
+        release = threading.Event()
+        running = asyncio.create_task(scheduler.run(blocking_job, release))
+        await wait_until(lambda: scheduler.stats()["running"] == 1)
+
+        with pytest.raises(DeadlineExceededError):
+            await scheduler.run(calls.append, "late", timeout_ms=20)
+
+        release.set()
+        await running
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert calls == []
+    assert stats["shed_deadline"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_non_positive_timeout_is_rejected():
+    async def scenario():
+        scheduler = RequestScheduler()
+        for timeout_ms in (0, -5):
+            with pytest.raises(ValueError):
+                await scheduler.run(lambda: None, timeout_ms=timeout_ms)
+
+    asyncio.run(scenario())
+
+
+def test_interactive_requests_are_served_before_batch():
+    order = []
+
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_queue_size=4)
+        release = threading.Event()
+        running = asyncio.create_task(scheduler.run(blocking_job, release))
+        await wait_until(lambda: scheduler.stats()["running"] == 1)
+
+        queued = []
+        for name, priority in [("batch-1", "batch"), ("interactive-1", "interactive"),
+                               ("batch-2", "batch"), ("interactive-2", "interactive")]:
+            queued.append(asyncio.create_task(scheduler.run(order.append, name, priority=priority)))
+            await asyncio.sleep(0)
+        await wait_until(lambda: scheduler.stats()["queue_depth"] == 4)
+
+        release.set()
+        await asyncio.gather(running, *queued)
+
+    asyncio.run(scenario())
+    assert order == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+
+
+def test_slot_is_handed_to_next_waiter():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_queue_size=2)
+        first_release, second_release = threading.Event(), threading.Event()
+        second_started = threading.Event()
+        first = asyncio.create_task(scheduler.run(blocking_job, first_release, result="first"))
+        await wait_until(lambda: scheduler.stats()["running"] == 1)
+        second = asyncio.create_task(
+            scheduler.run(blocking_job, second_release, second_started, result="second")
+        )
+        await wait_until(lambda: scheduler.stats()["queue_depth"] == 1)
+
+        first_release.set()
+        assert await first == "first"
+        await wait_until(second_started.is_set)
+        stats = scheduler.stats()
+        assert stats["running"] == 1
+        assert stats["queue_depth"] == 0
+
+        second_release.set()
+        assert await second == "second"
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["running"] == 0
+    assert stats["completed"] == 2
+
+
+def test_cancelled_caller_keeps_slot_until_job_ends():
+    async def scenario():
+        scheduler = RequestScheduler(max_concurrency=1, max_queue_size=1)
+        release, started = threading.Event(), threading.Event()
+        caller = asyncio.create_task(scheduler.run(blocking_job, release, started))
+        await wait_until(started.is_set)
+
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # The thread is still running, so the slot must stay taken.
+        assert scheduler.stats()["running"] == 1
+        queued = asyncio.create_task(scheduler.run(lambda: "queued"))
+        await wait_until(lambda: scheduler.stats()["queue_depth"] == 1)
+        with pytest.raises(QueueFullError):
+            await scheduler.run(lambda: None)
+
+        release.set()
+        assert await queued == "queued"
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["running"] == 0
+    assert stats["completed"] == 2
+
+
+class ClientError(Exception):
+    status_code = 404
+
+
+def test_client_errors_are_counted_as_rejected():
+    def reject():
+        raise ClientError()
+
+    def crash():
+        raise RuntimeError()
+
+    async def scenario():
+        scheduler = RequestScheduler()
+        for job in (reject, crash):
+            with pytest.raises(Exception):
+                await scheduler.run(job)
+        await scheduler.run(lambda: None)
+        await wait_until(lambda: scheduler.stats()["running"] == 0)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["completed"], stats["failed"], stats["rejected"]) == (1, 1, 1)